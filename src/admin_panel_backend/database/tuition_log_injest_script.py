@@ -30,122 +30,586 @@ Place this tuition_logs.csv file in the root directory of your EfficientTutor-ba
 '''
 #TODO: must abdullah, jacob: logging this lesson twice to log into the two parents
 import os
+import io
 import csv
+import uuid
+import pickle
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_batch, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 
+log = logging.getLogger(__name__)
+
 # --- CONFIGURATION ---
 # Load the DATABASE_URL from your .env file
 load_dotenv()
 DATABASE_URL = os.environ.get('DATABASE_URL')
 # The name of your CSV file
 CSV_FILE_PATH = 'tuition_logs.csv'
+# Print a progress line every this many CSV rows (per-row details are DEBUG logs)
+PROGRESS_EVERY = 1000
+# CSV headers that every file must have; 'lesson_index' is optional
+REQUIRED_CSV_COLUMNS = ('date', 'start_time', 'end_time', 'subject', 'attendees', 'cost_per_hour')
+# Removes the curly quotes Excel puts around the attendees, in one str.translate pass
+_QUOTE_STRIP = str.maketrans('', '', '“”')
+# Where the students lookup is cached between runs, one file per database (rebuild with --refresh-map)
+STUDENT_MAP_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'admin_panel')
+# The tuition_logs columns filled from the CSV, in the order rows are built
+TUITION_LOG_COLUMNS = (
+    'parent_user_id', 'subject', 'attendee_names', 'lesson_index',
+    'cost_per_hour', 'start_time', 'end_time',
+)
+COPY_TUITION_LOGS_SQL = (
+    f"COPY {{table}} ({', '.join(TUITION_LOG_COLUMNS)}) FROM STDIN WITH (FORMAT CSV)"
+)
+# COPY loads go through a fresh staging table, then move into tuition_logs in one statement.
+# It is a TEMP table, or for parallel loads an UNLOGGED table with a per-run suffix.
+STAGING_TABLE = 'tuition_logs_staging'
+INSERT_TUITION_LOGS_SQL = f"INSERT INTO tuition_logs ({', '.join(TUITION_LOG_COLUMNS)}) VALUES %s"
+PREPARE_TUITION_LOGS_SQL = (
+    f"PREPARE tuition_ins AS INSERT INTO tuition_logs ({', '.join(TUITION_LOG_COLUMNS)}) "
+    f"VALUES ({', '.join(f'${i}' for i in range(1, len(TUITION_LOG_COLUMNS) + 1))})"
+)
+EXECUTE_TUITION_LOGS_SQL = f"EXECUTE tuition_ins ({', '.join(['%s'] * len(TUITION_LOG_COLUMNS))})"
+# Rows per multi-VALUES statement (or EXECUTE batch); PostgreSQL gains little beyond ~1000
+INSERT_PAGE_SIZE = 1000
 
 def get_db_log_count(cur):
     """Gets the current number of rows in the tuition_logs table."""
     cur.execute("SELECT COUNT(*) AS count FROM tuition_logs;")
     return cur.fetchone()['count']
 
-def get_student_parent_map(cur):
+def get_student_map_cache_path():
+    """Gets the student map cache file of the current DATABASE_URL, so databases never share a cache."""
+    database_key = hashlib.sha256((DATABASE_URL or '').encode('utf-8')).hexdigest()[:16]
+    return os.path.join(STUDENT_MAP_CACHE_DIR, f"student_map-{database_key}.pkl")
+
+def get_students_signature(cur):
+    """
+    Gets a cheap fingerprint of the students table.
+    The cached student map is only reused while this stays the same, so it relies
+    on updated_at being kept current; use --refresh-map after editing students otherwise.
+    Returns None if students has no updated_at column, in which case nothing is cached.
+    """
+    cur.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_attribute
+            WHERE attrelid = 'students'::regclass AND attname = 'updated_at' AND NOT attisdropped
+        ) AS has_updated_at;
+    """)
+    if not cur.fetchone()['has_updated_at']:
+        return None
+    cur.execute("SELECT max(updated_at) AS updated_at, count(*) AS count FROM students;")
+    row = cur.fetchone()
+    return (str(row['updated_at']), row['count'])
+
+def load_cached_students(signature):
+    """
+    Loads the cached (first_name, student_id, parent_user_id) tuples.
+    Returns None if there is no usable cache for this signature.
+    """
+    try:
+        with open(get_student_map_cache_path(), 'rb') as cache_file:
+            cached_signature, students = pickle.load(cache_file)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+    return students if cached_signature == signature else None
+
+def save_cached_students(signature, students):
+    """Writes the student tuples to the local cache, next to their signature."""
+    try:
+        os.makedirs(STUDENT_MAP_CACHE_DIR, exist_ok=True)
+        with open(get_student_map_cache_path(), 'wb') as cache_file:
+            pickle.dump((signature, students), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as e:
+        print(f"  - WARNING: Could not cache the student map. Reason: {e}")
+
+def discard_cached_students():
+    """Deletes the cached student map of the current database, if there is one."""
+    try:
+        os.remove(get_student_map_cache_path())
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"  - WARNING: Could not delete the cached student map. Reason: {e}")
+
+def get_student_parent_map(cur, refresh=False):
     """
     Fetches all students and creates a mapping of
     { 'FirstName': ('student_id', 'parent_user_id') }
     This is crucial for looking up the required IDs.
+    The students are cached on disk and only re-queried when the table changed.
+    With refresh the students are always queried and the cache is rewritten.
     """
-    print("Fetching student and parent IDs from the database...")
-    cur.execute("SELECT id, user_id, first_name FROM students;")
-    student_map = {}
-    for row in cur.fetchall():
-        # This assumes first names are unique. If not, you may need to adjust.
-        student_map[row['first_name']] = (str(row['id']), str(row['user_id']))
-    print(f"Found {len(student_map)} students in the database.")
+    signature = get_students_signature(cur)
+    students = None if refresh or signature is None else load_cached_students(signature)
+    from_cache = students is not None
+    if not from_cache:
+        print("Fetching student and parent IDs from the database...")
+        cur.execute("SELECT id, user_id, first_name FROM students;")
+        students = [(row['first_name'], str(row['id']), str(row['user_id'])) for row in cur.fetchall()]
+        if signature is not None:
+            save_cached_students(signature, students)
+        elif refresh:
+            discard_cached_students()
+
+    # This assumes first names are unique. If not, you may need to adjust.
+    student_map = {
+        first_name: (student_id, parent_user_id)
+        for first_name, student_id, parent_user_id in students
+    }
+    if from_cache:
+        print(f"Loaded {len(student_map)} students from '{get_student_map_cache_path()}'.")
+    else:
+        print(f"Found {len(student_map)} students in the database.")
     return student_map
 
-def main():
+def get_parent_lookup(student_parent_map):
+    """
+    Flattens the student map to { 'FirstName': 'parent_user_id' }, so each CSV row
+    needs a single dict lookup instead of a membership test plus an index and unpack.
+    """
+    return {name: parent_user_id for name, (_, parent_user_id) in student_parent_map.items()}
+
+def warn_missing_students(missing_names, skipped_count):
+    """Prints one warning for all the rows skipped because of unknown first attendees."""
+    if missing_names:
+        print(f"  - WARNING: Skipping {skipped_count} rows. Students not found in the database: "
+              f"{', '.join(sorted(missing_names))}.")
+
+def get_csv_columns(header):
+    """
+    Resolves the column positions from the CSV header row, in REQUIRED_CSV_COLUMNS
+    order followed by lesson_index (None if the file has none), and returns them
+    with the number of fields a row needs to have all of them.
+    """
+    header = [name.strip() for name in header]
+    missing_columns = [name for name in REQUIRED_CSV_COLUMNS if name not in header]
+    if missing_columns:
+        raise ValueError(f"The CSV file is missing the required columns {missing_columns}.")
+    columns = [header.index(name) for name in REQUIRED_CSV_COLUMNS]
+    width = max(columns) + 1
+    if 'lesson_index' in header:
+        columns.append(header.index('lesson_index'))
+        width = max(width, columns[-1] + 1)
+    else:
+        columns.append(None)
+    return columns, width
+
+def read_log_rows(csvfile, student_parent_map, strip_curly_quotes=True):
+    """
+    Reads the CSV and returns the tuition_logs rows, in TUITION_LOG_COLUMNS order.
+    Rows are read as plain lists with the column positions resolved once from the
+    header, and the loop is specialized on whether the file has a lesson_index column.
+    cost_per_hour and lesson_index stay raw strings: PostgreSQL parses them during
+    the load, so a malformed number fails the load instead of skipping the row.
+    A blank cost_per_hour is skipped here, since COPY would load it as NULL.
+    """
+    quote_strip = _QUOTE_STRIP if strip_curly_quotes else {}
+    reader = csv.reader(csvfile)
+    (D, ST, ET, SU, AT, CPH, LI), width = get_csv_columns(next(reader, []))
+    has_lesson_index = LI is not None
+
+    # --- Pre-flight: parse every row's attendees and resolve the unknown students at once ---
+    csv_rows, attendees = [], []
+    for row in reader:
+        if len(row) < width:
+            if row:  # blank lines come out as empty lists, dropped silently like DictReader did
+                print(f"  - WARNING: Skipping invalid row: {row}. Reason: expected {width} fields.")
+            continue
+        # THE FIX: Sanitize each name to remove whitespace AND curly quotes.
+        attendee_names = [name.strip() for name in row[AT].translate(quote_strip).split(',')]
+        if not attendee_names[0]:
+            print(f"  - WARNING: Skipping invalid row: {row}. Reason: no attendees.")
+            continue
+        if not row[CPH].strip():
+            print(f"  - WARNING: Skipping invalid row: {row}. Reason: no cost_per_hour.")
+            continue
+        csv_rows.append(row)
+        attendees.append(attendee_names)
+
+    # Find the parent ID. We assume all students in a group have the same parent.
+    parent_for = get_parent_lookup(student_parent_map)
+    missing_names = {names[0] for names in attendees} - parent_for.keys()
+    if missing_names:
+        kept = [(row, names) for row, names in zip(csv_rows, attendees) if names[0] not in missing_names]
+        warn_missing_students(missing_names, len(csv_rows) - len(kept))
+    else:
+        kept = zip(csv_rows, attendees)
+
+    # Every remaining first attendee is known, so the loops index parent_for directly
+    rows = []
+    if has_lesson_index:
+        for i, (row, attendee_names) in enumerate(kept, start=1):
+            if i % PROGRESS_EVERY == 0:
+                print(f"  - Processed {i} rows...")
+            log.debug("  - Queueing log for %s on %s for %s...", row[SU], row[D], attendee_names)
+            rows.append((
+                parent_for[attendee_names[0]],
+                row[SU],
+                to_pg_array(attendee_names),
+                row[LI].strip() or None,
+                row[CPH],
+                f"{row[D]} {row[ST]}",
+                f"{row[D]} {row[ET]}",
+            ))
+    else:
+        for i, (row, attendee_names) in enumerate(kept, start=1):
+            if i % PROGRESS_EVERY == 0:
+                print(f"  - Processed {i} rows...")
+            log.debug("  - Queueing log for %s on %s for %s...", row[SU], row[D], attendee_names)
+            rows.append((
+                parent_for[attendee_names[0]],
+                row[SU],
+                to_pg_array(attendee_names),
+                None,
+                row[CPH],
+                f"{row[D]} {row[ST]}",
+                f"{row[D]} {row[ET]}",
+            ))
+
+    return rows
+
+def read_log_rows_pandas(csvfile, student_parent_map, strip_curly_quotes=True):
+    """
+    Same as read_log_rows, but transforms the whole CSV with vectorized pandas
+    string operations instead of a Python loop per row.
+    pandas is an optional dependency, only needed for --pandas.
+    """
+    import pandas as pd
+
+    # Tokenized with csv.reader like read_log_rows, so both readers see the same fields.
+    # pd.read_csv fills short rows with '' like empty cells, and shifts or rejects
+    # rows with a trailing comma.
+    reader = csv.reader(csvfile)
+    (D, ST, ET, SU, AT, CPH, LI), width = get_csv_columns(next(reader, []))
+    # Blank lines are dropped like in read_log_rows; short rows are padded with None
+    csv_rows = list(filter(None, reader))
+    df = pd.DataFrame(csv_rows)
+    too_short = df[width - 1].isna() if df.shape[1] >= width else pd.Series(True, index=df.index)
+    for i in df.index[too_short]:
+        print(f"  - WARNING: Skipping invalid row: {csv_rows[i]}. Reason: expected {width} fields.")
+    df = df[~too_short]
+    if df.empty:
+        return []
+
+    # THE FIX: Sanitize each name to remove whitespace AND curly quotes.
+    attendees = df[AT].str.translate(_QUOTE_STRIP) if strip_curly_quotes else df[AT]
+    attendee_names = attendees.str.split(',').map(
+        lambda names: [name.strip() for name in names]
+    )
+
+    first_student_names = attendee_names.str[0]
+    has_attendees = first_student_names != ''
+    has_cost = df[CPH].str.strip() != ''
+    valid = has_attendees & has_cost
+    for i in df.index[~valid]:
+        if not has_attendees[i]:
+            print(f"  - WARNING: Skipping invalid row: {csv_rows[i]}. Reason: no attendees.")
+        elif not has_cost[i]:
+            print(f"  - WARNING: Skipping invalid row: {csv_rows[i]}. Reason: no cost_per_hour.")
+    df, attendee_names, first_student_names = (
+        df[valid], attendee_names[valid], first_student_names[valid]
+    )
+
+    # Find the parent ID. We assume all students in a group have the same parent.
+    parent_user_ids = first_student_names.map(get_parent_lookup(student_parent_map))
+    known = parent_user_ids.notna()
+    warn_missing_students(set(first_student_names[~known]), int((~known).sum()))
+
+    df = df[known]
+    start_times = df[D] + ' ' + df[ST]
+    end_times = df[D] + ' ' + df[ET]
+    if LI is not None:
+        lesson_index = [value.strip() or None for value in df[LI].tolist()]
+    else:
+        lesson_index = [None] * len(df)
+    return list(zip(
+        parent_user_ids[known].tolist(),
+        df[SU].tolist(),
+        attendee_names[known].map(to_pg_array).tolist(),
+        lesson_index,
+        df[CPH].tolist(),
+        start_times.tolist(),
+        end_times.tolist(),
+    ))
+
+def drop_tuition_log_indexes(cur):
+    """
+    Drops the indexes of tuition_logs and returns their CREATE INDEX statements.
+    Indexes backing a constraint (primary key, unique) are kept.
+    """
+    cur.execute("""
+        SELECT i.indexrelid::regclass::text AS name, pg_get_indexdef(i.indexrelid) AS definition
+        FROM pg_index i
+        WHERE i.indrelid = 'tuition_logs'::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid);
+    """)
+    indexes = cur.fetchall()
+    for index in indexes:
+        cur.execute(f"DROP INDEX {index['name']};")
+    return [index['definition'] for index in indexes]
+
+def to_pg_array(names):
+    """
+    Formats a list of names as a PostgreSQL array literal, e.g. {"John","Jane"}.
+    Rows carry this string instead of the list, so neither COPY nor execute_values
+    has to adapt a Python list per row.
+    """
+    return '{' + ','.join('"' + name.replace('\\', '\\\\').replace('"', '\\"') + '"' for name in names) + '}'
+
+def copy_logs(cur, rows, table='tuition_logs'):
+    """
+    Loads all prepared rows into tuition_logs (or table) with a single COPY FROM STDIN,
+    instead of one INSERT round-trip per row.
+    """
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    cur.copy_expert(COPY_TUITION_LOGS_SQL.format(table=table), buf)
+
+def insert_logs(cur, rows):
+    """
+    Loads all prepared rows into tuition_logs with batched multi-VALUES INSERTs.
+    Slower than COPY, but leaves room for per-row INSERT semantics (ON CONFLICT, ...).
+    The attendee_names array literals are cast to the column type by PostgreSQL.
+    """
+    execute_values(cur, INSERT_TUITION_LOGS_SQL, rows, page_size=INSERT_PAGE_SIZE)
+
+def insert_logs_prepared(cur, rows):
+    """
+    Loads all prepared rows into tuition_logs with one INSERT per row, for when
+    the rows must go through single-row INSERTs (row triggers, RLS policies).
+    The statement is prepared once on the server so rows are not re-parsed and
+    re-planned, and the EXECUTEs are sent in batches to save round-trips.
+    """
+    cur.execute(PREPARE_TUITION_LOGS_SQL)
+    execute_batch(cur, EXECUTE_TUITION_LOGS_SQL, rows, page_size=INSERT_PAGE_SIZE)
+    cur.execute("DEALLOCATE tuition_ins;")
+
+def prepare_staging_table(cur, table, shared=False):
+    """
+    Creates a new, empty staging table with the loaded tuition_logs columns, so it
+    always matches the current column types.
+    It is a TEMP table (no CREATE privilege needed, dropped at commit) unless it must
+    be shared with the parallel workers' connections; then it is a regular UNLOGGED
+    table, which writes no WAL either. The caller gives a shared table a per-run name,
+    so concurrent runs never mix their rows.
+    """
+    columns = ', '.join(TUITION_LOG_COLUMNS)
+    if shared:
+        cur.execute(f"CREATE UNLOGGED TABLE {table} AS SELECT {columns} FROM tuition_logs WITH NO DATA;")
+    else:
+        cur.execute(f"CREATE TEMP TABLE {table} ON COMMIT DROP AS SELECT {columns} FROM tuition_logs WITH NO DATA;")
+
+def copy_logs_parallel(rows, workers, table):
+    """
+    Splits the rows round-robin over `workers` connections that COPY their share
+    into the shared staging table concurrently, each committing on its own.
+    tuition_logs itself is only touched once every worker has succeeded.
+    """
+    pool = ThreadedConnectionPool(1, workers, DATABASE_URL)
+
+    def copy_chunk(chunk):
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                copy_logs(cur, chunk, table=table)
+            conn.commit()
+        except psycopg2.Error:
+            conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # list() re-raises the first failed chunk's error here
+            list(executor.map(copy_chunk, (rows[i::workers] for i in range(workers))))
+    finally:
+        pool.closeall()
+
+def move_staged_logs(cur, table):
+    """Moves everything in the staging table into tuition_logs with one INSERT ... SELECT, then drops it."""
+    columns = ', '.join(TUITION_LOG_COLUMNS)
+    cur.execute(f"INSERT INTO tuition_logs ({columns}) SELECT {columns} FROM {table};")
+    cur.execute(f"DROP TABLE {table};")
+
+def drop_staging_table(conn, table):
+    """Drops a shared staging table left behind by a failed parallel load."""
+    try:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {table};")
+        conn.commit()
+    except psycopg2.Error as e:
+        print(f"  - WARNING: Could not drop the staging table '{table}'. Reason: {e}")
+
+# How the prepared rows are written to the database, selectable with --insert-mode
+LOADERS = {
+    'copy': copy_logs,
+    'values': insert_logs,
+    'prepared': insert_logs_prepared,
+}
+
+def parse_args(argv=None):
+    """Parses the command line options of the ingest script."""
+    parser = argparse.ArgumentParser(description="Re-uploads tuition_logs from a CSV file.")
+    parser.add_argument(
+        '--insert-mode', choices=LOADERS, default='copy',
+        help="'copy' streams the rows with COPY FROM STDIN (default), "
+             "'values' uses batched INSERT ... VALUES statements, "
+             "'prepared' runs a prepared single-row INSERT per row.",
+    )
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help="Number of concurrent COPY connections (copy mode only, default 1). "
+             "More than one needs CREATE privilege for the shared staging table.",
+    )
+    parser.add_argument(
+        '--truncate', action=argparse.BooleanOptionalAction, default=True,
+        help="Erase all existing tuition_logs before loading (default). "
+             "With --no-truncate the CSV rows are appended.",
+    )
+    parser.add_argument(
+        '--strip-curly-quotes', action=argparse.BooleanOptionalAction, default=True,
+        help="Remove the curly quotes Excel puts around the attendee names (default).",
+    )
+    parser.add_argument(
+        '--refresh-map', action='store_true',
+        help="Re-query the students table instead of using the cached student map "
+             "(needed after editing students if their updated_at isn't kept current).",
+    )
+    parser.add_argument(
+        '--fast-reload', action='store_true',
+        help="Drop the tuition_logs indexes and disable its triggers (including foreign key "
+             "checks) during the load. Referential integrity of the new rows is NOT checked. "
+             "Needs superuser, since the foreign key triggers are system triggers.",
+    )
+    parser.add_argument(
+        '--pandas', action='store_true',
+        help="Transform the CSV with vectorized pandas operations (requires pandas).",
+    )
+    parser.add_argument(
+        '-v', '--verbose', action='store_true',
+        help="Log every CSV row as it is processed.",
+    )
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1.")
+    if args.workers > 1 and args.insert_mode != 'copy':
+        parser.error("--workers only applies to --insert-mode copy.")
+    if args.fast_reload and args.insert_mode == 'prepared':
+        parser.error("--fast-reload would disable the row triggers --insert-mode prepared is for.")
+    return args
+
+def main(argv=None):
     """
     Main function to read the CSV and insert logs into the database.
     """
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format='%(message)s')
+
     if not DATABASE_URL:
         print("ERROR: DATABASE_URL not found. Make sure it's in your .env file.")
         return
 
+    # Set while a committed staging table for the parallel workers exists
+    shared_staging_table = None
+
     try:
         # --- Confirmation Step ---
-        print("!!! WARNING: This script will completely erase all data in the 'tuition_logs' table.")
-        confirm = input("Are you sure you want to continue? (yes/no): ")
-        if confirm.lower() != 'yes':
-            print("Operation cancelled by user.")
-            return
+        if args.truncate:
+            print("!!! WARNING: This script will completely erase all data in the 'tuition_logs' table.")
+            confirm = input("Are you sure you want to continue? (yes/no): ")
+            if confirm not in {'yes', 'YES', 'Yes', 'y', 'Y'}:
+                print("Operation cancelled by user.")
+                return
 
         conn = psycopg2.connect(DATABASE_URL)
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # The whole reload must be one transaction, never autocommitted row by row
+        conn.autocommit = False
+        # Dict rows only where results are read; the loads go through a plain cursor
+        with conn.cursor(cursor_factory=RealDictCursor) as meta_cur, conn.cursor() as ins_cur:
 
-            # Deleting all tuition logs
-            print("\nErasing all existing logs from the database...")
-            cur.execute("DELETE FROM tuition_logs;")
-            print("Table 'tuition_logs' cleared.")
+            student_parent_map = get_student_parent_map(meta_cur, refresh=args.refresh_map)
 
-            # reuploading the csv
-            student_parent_map = get_student_parent_map(cur)
-            
             print(f"\nReading data from '{CSV_FILE_PATH}'...")
-            with open(CSV_FILE_PATH, mode='r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                
-                for row in reader:
-                    try:
-                        # THE FIX: Sanitize each name to remove whitespace AND curly quotes.
-                        attendee_names = [name.strip().strip('“”') for name in row['attendees'].split(',')]
-                        
-                        print(attendee_names)
-                        
-                        # Find the parent ID. We assume all students in a group have the same parent.
-                        first_student_name = attendee_names[0]
-                        if first_student_name not in student_parent_map:
-                            print(f"  - WARNING: Skipping row. Student '{first_student_name}' not found in the database.")
-                            continue
-                        
-                        _, parent_user_id = student_parent_map[first_student_name]
-
-                        # Format data for the database query
-                        start_time = f"{row['date']} {row['start_time']}"
-                        end_time = f"{row['date']} {row['end_time']}"
-                        lesson_index = int(row['lesson_index']) if row.get('lesson_index') else None
-
-                        print(f"  - Inserting log for {row['subject']} on {row['date']} for {attendee_names}...")
-                        
-                        cur.execute(
-                            """
-                            INSERT INTO tuition_logs 
-                            (parent_user_id, subject, attendee_names, lesson_index, cost_per_hour, start_time, end_time)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s);
-                            """,
-                            (
-                                parent_user_id,
-                                row['subject'],
-                                attendee_names,
-                                lesson_index,
-                                float(row['cost_per_hour']),
-                                start_time,
-                                end_time
-                            )
-                        )
-                    except (KeyError, ValueError) as e:
-                        print(f"  - WARNING: Skipping invalid row: {row}. Reason: {e}")
-                        continue
+            with open(CSV_FILE_PATH, mode='r', encoding='utf-8', newline='') as csvfile:
+                read_rows = read_log_rows_pandas if args.pandas else read_log_rows
+                rows = read_rows(csvfile, student_parent_map, strip_curly_quotes=args.strip_curly_quotes)
+
+            if args.insert_mode == 'copy':
+                staging_table = STAGING_TABLE
+                if args.workers > 1:
+                    staging_table = f"{STAGING_TABLE}_{uuid.uuid4().hex[:12]}"
+                prepare_staging_table(ins_cur, staging_table, shared=args.workers > 1)
+                print(f"\nCopying {len(rows)} logs into '{staging_table}' with {args.workers} workers...")
+                if args.workers > 1:
+                    # The workers' connections only see the staging table once committed
+                    conn.commit()
+                    shared_staging_table = staging_table
+                    copy_logs_parallel(rows, args.workers, staging_table)
+                else:
+                    copy_logs(ins_cur, rows, table=staging_table)
+
+            # Erasing all tuition logs, only once the CSV is parsed to keep the table lock short
+            if args.truncate:
+                print("\nErasing all existing logs from the database...")
+                ins_cur.execute("TRUNCATE tuition_logs RESTART IDENTITY;")
+                print("Table 'tuition_logs' cleared.")
+
+            # reuploading the csv, without waiting for the WAL flush on commit
+            ins_cur.execute("SET LOCAL synchronous_commit = off;")
+            # DEFERRABLE foreign keys are then checked once at COMMIT instead of per row
+            ins_cur.execute("SET CONSTRAINTS ALL DEFERRED;")
+            if args.fast_reload:
+                index_definitions = drop_tuition_log_indexes(meta_cur)
+                ins_cur.execute("ALTER TABLE tuition_logs DISABLE TRIGGER ALL;")
+                print(f"Dropped {len(index_definitions)} indexes and disabled triggers for the load.")
 
+            if args.insert_mode == 'copy':
+                print("\nMoving the staged logs into 'tuition_logs'...")
+                move_staged_logs(ins_cur, staging_table)
+            else:
+                print(f"\nWriting {len(rows)} logs into the database ({args.insert_mode})...")
+                LOADERS[args.insert_mode](ins_cur, rows)
+
+            if args.fast_reload:
+                # Rebuilt in this transaction: the table is locked by the TRUNCATE anyway,
+                # and CREATE INDEX CONCURRENTLY can't run inside a transaction block
+                ins_cur.execute("ALTER TABLE tuition_logs ENABLE TRIGGER ALL;")
+                for index_definition in index_definitions:
+                    ins_cur.execute(index_definition)
+                print("Re-enabled triggers and rebuilt indexes.")
             conn.commit()
+            shared_staging_table = None
             print("\nSUCCESS: All logs have been successfully inserted into the database.")
 
     except psycopg2.Error as e:
         print(f"\nDATABASE ERROR: {e}")
         if 'conn' in locals():
             conn.rollback()
+    except ValueError as e:
+        print(f"\nCSV ERROR: {e}")
+        if 'conn' in locals():
+            conn.rollback()
     except FileNotFoundError:
         print(f"\nFILE ERROR: Could not find the file '{CSV_FILE_PATH}'. Make sure it's in the same directory.")
+    except ImportError as e:
+        # Only --pandas imports lazily
+        print(f"\nERROR: --pandas needs pandas installed ({e}). Install it or run without --pandas.")
+        if 'conn' in locals():
+            conn.rollback()
     finally:
         if 'conn' in locals() and conn:
+            if shared_staging_table:
+                drop_staging_table(conn, shared_staging_table)
             conn.close()
 
 if __name__ == "__main__":
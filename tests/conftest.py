@@ -0,0 +1,7 @@
+'''
+Makes the src/ layout importable for the tests
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
@@ -0,0 +1,677 @@
+'''
+Tests for the tuition log ingest script, run against an in-memory fake connection
+'''
+import io
+import os
+import sys
+import csv
+
+import pytest
+
+pytest.importorskip('psycopg2')
+pytest.importorskip('dotenv')
+
+from admin_panel_backend.database import tuition_log_injest_script as ingest
+
+STUDENTS = ('Ali', 'Omran', 'Mila')
+COPY_SQL = ingest.COPY_TUITION_LOGS_SQL.format(table='tuition_logs')
+COLUMNS = ', '.join(ingest.TUITION_LOG_COLUMNS)
+MOVE_SQL = f"INSERT INTO tuition_logs ({COLUMNS}) SELECT {COLUMNS} FROM {ingest.STAGING_TABLE};"
+CSV_TEXT = (
+    'date,start_time,end_time,subject,attendees,cost_per_hour,lesson_index\n'
+    '2025-09-01,18:32,19:31,Math,“Ali”,6,1\n'
+    '2025-09-01,19:33,21:07,Physics,"“Omran,Mila”",9,2\n'
+)
+
+
+class FakeCursor:
+    def __init__(self, db, cursor_factory=None):
+        self.db = db
+        self.cursor_factory = cursor_factory
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.db.statements.append(sql)
+        self.db.cursor_factories.append(self.cursor_factory)
+        self.last_sql = sql
+
+    def fetchone(self):
+        if 'FROM pg_attribute' in self.last_sql:
+            return {'has_updated_at': self.db.students_have_updated_at}
+        if 'FROM students' in self.last_sql:
+            return {'updated_at': self.db.students_updated_at, 'count': len(self.db.students)}
+        raise AssertionError(f"unexpected fetchone() after {self.last_sql!r}")
+
+    def fetchall(self):
+        if 'FROM pg_index' in self.last_sql:
+            return [{'name': name, 'definition': definition} for name, definition in self.db.indexes]
+        return [
+            {'id': i, 'user_id': f'parent-{name}', 'first_name': name}
+            for i, name in enumerate(self.db.students, start=1)
+        ]
+
+    def copy_expert(self, sql, file):
+        self.db.statements.append(sql)
+        self.db.cursor_factories.append(self.cursor_factory)
+        if self.db.fail_copy:
+            raise ingest.psycopg2.Error('COPY failed')
+        self.db.copies.append((sql, file.read()))
+
+
+class FakeConnection:
+    def __init__(self, students=STUDENTS):
+        self.students = students
+        self.students_updated_at = '2025-09-01 00:00:00'
+        self.students_have_updated_at = True
+        self.indexes = [(
+            'tuition_logs_start_time_idx',
+            'CREATE INDEX tuition_logs_start_time_idx ON tuition_logs (start_time)',
+        )]
+        self.statements = []
+        self.cursor_factories = []
+        self.copies = []
+        self.fail_copy = False
+        self.autocommit = True
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self, cursor_factory)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    fail_copy = False
+
+    def __init__(self, minconn, maxconn, dsn):
+        self.maxconn = maxconn
+        self.connections = []
+        self.closed = False
+
+    def getconn(self):
+        conn = FakeConnection()
+        conn.fail_copy = self.fail_copy
+        self.connections.append(conn)
+        return conn
+
+    def putconn(self, conn):
+        pass
+
+    def closeall(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    '''Records the worker connection pools main() opens.'''
+    pools = []
+
+    def make_pool(*args):
+        pools.append(FakePool(*args))
+        return pools[-1]
+
+    monkeypatch.setattr(ingest, 'ThreadedConnectionPool', make_pool)
+    return pools
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    '''Points main() at a fake connection and a CSV file in tmp_path.'''
+    conn = FakeConnection()
+    csv_path = tmp_path / 'tuition_logs.csv'
+    csv_path.write_text(CSV_TEXT, encoding='utf-8')
+    monkeypatch.setattr(ingest, 'DATABASE_URL', 'postgresql://test')
+    monkeypatch.setattr(ingest, 'CSV_FILE_PATH', str(csv_path))
+    monkeypatch.setattr(ingest, 'STUDENT_MAP_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(ingest.psycopg2, 'connect', lambda url: conn)
+    monkeypatch.setattr('builtins.input', lambda prompt: 'yes')
+    return conn
+
+
+def student_queries(conn):
+    return [sql for sql in conn.statements if sql.startswith('SELECT id, user_id, first_name')]
+
+
+def copied_rows(conn):
+    '''Parses the CSV that main() streamed through COPY back into rows.'''
+    return [row for _, data in conn.copies for row in csv.reader(io.StringIO(data))]
+
+
+@pytest.mark.parametrize('names, literal', [
+    (['Ali'], '{"Ali"}'),
+    (['Omran', 'Mila'], '{"Omran","Mila"}'),
+    (['Al Ali', 'NULL', ''], '{"Al Ali","NULL",""}'),
+    (['a"b', 'c\\d', 'e,f'], '{"a\\"b","c\\\\d","e,f"}'),
+])
+def test_to_pg_array(names, literal):
+    assert ingest.to_pg_array(names) == literal
+
+
+def test_copy_logs_streams_the_rows_as_csv():
+    conn = FakeConnection()
+    ingest.copy_logs(conn.cursor(), [('p', 'Math', '{"Al Ali"}', None, 6.0, 'd s', 'd e')])
+    assert conn.copies == [(COPY_SQL, 'p,Math,"{""Al Ali""}",,6.0,d s,d e\r\n')]
+
+
+def test_main_loads_the_csv_with_a_single_copy(db):
+    ingest.main([])
+    assert len(db.copies) == 1
+    assert not [sql for sql in db.statements if 'VALUES' in sql]
+    assert copied_rows(db) == [
+        ['parent-Ali', 'Math', '{"Ali"}', '1', '6', '2025-09-01 18:32', '2025-09-01 19:31'],
+        ['parent-Omran', 'Physics', '{"Omran","Mila"}', '2', '9', '2025-09-01 19:33', '2025-09-01 21:07'],
+    ]
+    assert db.commits == 1
+
+
+def test_insert_logs_pages_the_rows_through_execute_values(monkeypatch):
+    calls = []
+    monkeypatch.setattr(ingest, 'execute_values', lambda *args, **kwargs: calls.append((args, kwargs)))
+    cur, rows = object(), [('p', 'Math', '{"Ali"}', None, 6.0, 'd s', 'd e')]
+    ingest.insert_logs(cur, rows)
+    assert calls == [((cur, ingest.INSERT_TUITION_LOGS_SQL, rows), {'page_size': ingest.INSERT_PAGE_SIZE})]
+
+
+def test_main_insert_mode_values_skips_copy(db, monkeypatch):
+    inserted = []
+    monkeypatch.setattr(ingest, 'execute_values', lambda cur, sql, rows, page_size: inserted.extend(rows))
+    ingest.main(['--insert-mode', 'values'])
+    assert not db.copies
+    assert [row[:3] for row in inserted] == [
+        ('parent-Ali', 'Math', '{"Ali"}'),
+        ('parent-Omran', 'Physics', '{"Omran","Mila"}'),
+    ]
+
+
+def test_parse_args_insert_mode():
+    assert ingest.parse_args([]).insert_mode == 'copy'
+    assert ingest.parse_args(['--insert-mode', 'values']).insert_mode == 'values'
+    with pytest.raises(SystemExit):
+        ingest.parse_args(['--insert-mode', 'bulk'])
+
+
+def test_student_map_is_reused_from_the_cache(db):
+    expected = {name: (str(i), f'parent-{name}') for i, name in enumerate(STUDENTS, start=1)}
+    assert ingest.get_student_parent_map(db.cursor()) == expected
+    db.students = ('Renamed', 'Omran', 'Mila')  # not seen while the signature is unchanged
+    assert ingest.get_student_parent_map(db.cursor()) == expected
+    assert len(student_queries(db)) == 1
+
+
+def test_student_map_is_requeried_when_the_students_change(db):
+    ingest.get_student_parent_map(db.cursor())
+    db.students_updated_at = '2025-09-02 00:00:00'
+    assert 'Ali' in ingest.get_student_parent_map(db.cursor())
+    assert len(student_queries(db)) == 2
+
+
+def test_refresh_map_requeries_the_students_and_rewrites_the_cache(db):
+    ingest.get_student_parent_map(db.cursor())
+    db.students = ('Renamed', 'Omran', 'Mila')  # edited without touching updated_at
+    assert 'Renamed' in ingest.get_student_parent_map(db.cursor(), refresh=True)
+    assert len(student_queries(db)) == 2
+    assert os.path.exists(ingest.get_student_map_cache_path())
+    assert 'Renamed' in ingest.get_student_parent_map(db.cursor())
+    assert len(student_queries(db)) == 2
+    assert ingest.parse_args(['--refresh-map']).refresh_map
+
+
+def test_student_map_reports_where_it_came_from(db, capsys):
+    ingest.get_student_parent_map(db.cursor())
+    assert 'Found 3 students in the database.' in capsys.readouterr().out
+    ingest.get_student_parent_map(db.cursor())
+    out = capsys.readouterr().out
+    assert 'Loaded 3 students from' in out and 'in the database' not in out
+
+
+def test_student_map_cache_is_kept_per_database(db, monkeypatch):
+    ingest.get_student_parent_map(db.cursor())
+    first_path = ingest.get_student_map_cache_path()
+    monkeypatch.setattr(ingest, 'DATABASE_URL', 'postgresql://other')
+    assert ingest.get_student_map_cache_path() != first_path
+    ingest.get_student_parent_map(db.cursor())
+    assert len(student_queries(db)) == 2
+    assert os.path.exists(first_path) and os.path.exists(ingest.get_student_map_cache_path())
+
+
+def test_student_map_is_not_cached_without_updated_at(db):
+    db.students_have_updated_at = False
+    ingest.get_student_parent_map(db.cursor())
+    ingest.get_student_parent_map(db.cursor())
+    assert len(student_queries(db)) == 2
+    assert not [sql for sql in db.statements if 'max(updated_at)' in sql]
+    assert not os.path.exists(ingest.STUDENT_MAP_CACHE_DIR)
+
+
+def test_main_prints_progress_instead_of_every_row(db, monkeypatch, capsys, caplog):
+    monkeypatch.setattr(ingest, 'PROGRESS_EVERY', 2)
+    with caplog.at_level('DEBUG', logger=ingest.__name__):
+        ingest.main([])
+    out = capsys.readouterr().out
+    assert 'Processed 2 rows' in out
+    assert 'Queueing' not in out and "['Ali']" not in out
+    assert [r.levelname for r in caplog.records if 'Queueing' in r.getMessage()] == ['DEBUG', 'DEBUG']
+
+
+STUDENT_MAP = {name: (str(i), f'parent-{name}') for i, name in enumerate(STUDENTS, start=1)}
+HEADER = 'date,start_time,end_time,subject,attendees,cost_per_hour,lesson_index\n'
+
+
+def read(text, **kwargs):
+    return ingest.read_log_rows(io.StringIO(text), STUDENT_MAP, **kwargs)
+
+
+def test_read_log_rows_builds_rows_in_column_order():
+    assert read(CSV_TEXT) == [
+        ('parent-Ali', 'Math', '{"Ali"}', '1', '6', '2025-09-01 18:32', '2025-09-01 19:31'),
+        ('parent-Omran', 'Physics', '{"Omran","Mila"}', '2', '9', '2025-09-01 19:33', '2025-09-01 21:07'),
+    ]
+
+
+def test_read_log_rows_resolves_columns_from_the_header():
+    text = ' attendees ,subject,date,start_time,end_time,cost_per_hour\nAli,Physics,2025-09-02,17:00,18:00,6\n'
+    assert read(text) == [('parent-Ali', 'Physics', '{"Ali"}', None, '6', '2025-09-02 17:00', '2025-09-02 18:00')]
+
+
+def test_read_log_rows_rejects_missing_required_columns():
+    with pytest.raises(ValueError, match='cost_per_hour'):
+        read('date,start_time,end_time,subject,attendees\n2025-09-01,a,b,Math,Ali\n')
+
+
+def test_read_log_rows_skips_short_and_blank_rows(capsys):
+    rows = read(HEADER + '2025-09-01,a,b,Math\n\n2025-09-01,a,b,Math,Ali,6,1\n')
+    assert [row[0] for row in rows] == ['parent-Ali']
+    assert capsys.readouterr().out == (
+        "  - WARNING: Skipping invalid row: ['2025-09-01', 'a', 'b', 'Math']. Reason: expected 7 fields.\n"
+    )
+
+
+def test_main_reports_a_csv_without_required_columns(db, capsys):
+    with open(ingest.CSV_FILE_PATH, 'w', encoding='utf-8') as csvfile:
+        csvfile.write('date,subject\n2025-09-01,Math\n')
+    ingest.main([])
+    assert 'CSV ERROR' in capsys.readouterr().out
+    assert not db.copies and db.commits == 0 and db.rollbacks == 1
+    assert not [sql for sql in db.statements if 'TRUNCATE' in sql]
+
+
+BUNDLED_CSV_PATH = os.path.join(os.path.dirname(ingest.__file__), 'tuition_logs.csv')
+
+
+def bundled_csv_students():
+    '''A student map for every name in the bundled CSV except the first one.'''
+    with open(BUNDLED_CSV_PATH, newline='', encoding='utf-8') as csvfile:
+        names = {name.strip('“”') for row in csv.DictReader(csvfile) for name in row['attendees'].split(',')}
+    # Leaving one student out compares the unknown-student path too.
+    return {name: (str(i), f'parent-{name}') for i, name in enumerate(sorted(names)[1:], start=1)}
+
+
+@pytest.mark.parametrize('strip_curly_quotes', [True, False])
+def test_pandas_reader_matches_the_csv_reader_on_the_bundled_logs(strip_curly_quotes):
+    pytest.importorskip('pandas')
+    students = bundled_csv_students()
+    if not strip_curly_quotes:
+        # The names then keep their quotes, as in “Omran,Mila” or “Ali”
+        students = {key: ids for name, ids in students.items() for key in (f'“{name}', f'“{name}”')}
+    with open(BUNDLED_CSV_PATH, newline='', encoding='utf-8') as csvfile:
+        expected = ingest.read_log_rows(csvfile, students, strip_curly_quotes)
+    with open(BUNDLED_CSV_PATH, newline='', encoding='utf-8') as csvfile:
+        actual = ingest.read_log_rows_pandas(csvfile, students, strip_curly_quotes)
+    assert expected and actual == expected
+
+
+def test_main_pandas_loads_the_same_rows(db):
+    pytest.importorskip('pandas')
+    ingest.main([])
+    ingest.main(['--pandas'])
+    first, second = db.copies
+    assert first == second
+
+
+def test_main_truncates_after_reading_and_loads_in_one_transaction(db):
+    ingest.main([])
+    assert not [sql for sql in db.statements if sql.startswith('DELETE')]
+    truncate = db.statements.index('TRUNCATE tuition_logs RESTART IDENTITY;')
+    assert db.statements[truncate + 1] == 'SET LOCAL synchronous_commit = off;'
+    assert db.statements[truncate + 3].startswith('INSERT INTO tuition_logs')
+    assert db.commits == 1
+
+
+def test_main_fast_reload_rebuilds_the_indexes_after_the_load(db):
+    ingest.main(['--fast-reload'])
+    statements = [sql.strip().split('\n')[0] for sql in db.statements]
+    load = statements.index(MOVE_SQL)
+    assert statements[load - 2:load] == [
+        'DROP INDEX tuition_logs_start_time_idx;',
+        'ALTER TABLE tuition_logs DISABLE TRIGGER ALL;',
+    ]
+    assert statements[-2:] == [
+        'ALTER TABLE tuition_logs ENABLE TRIGGER ALL;',
+        'CREATE INDEX tuition_logs_start_time_idx ON tuition_logs (start_time)',
+    ]
+    assert db.commits == 1
+
+
+def test_main_keeps_the_indexes_without_fast_reload(db):
+    ingest.main([])
+    assert not [sql for sql in db.statements if 'INDEX' in sql or 'TRIGGER' in sql]
+
+
+def test_parse_args_workers():
+    assert ingest.parse_args([]).workers == 1
+    assert ingest.parse_args(['--workers', '4']).workers == 4
+
+
+@pytest.mark.parametrize('argv', [
+    ['--workers', '0'],
+    ['--insert-mode', 'values', '--workers', '2'],
+])
+def test_parse_args_rejects_invalid_workers(argv):
+    with pytest.raises(SystemExit):
+        ingest.parse_args(argv)
+
+
+def shared_staging_table(conn):
+    '''The name of the UNLOGGED staging table main() created for its workers.'''
+    [create] = [sql for sql in conn.statements if sql.startswith('CREATE UNLOGGED TABLE')]
+    return create.split()[3]
+
+
+def test_main_workers_copy_through_the_staging_table(db, pools):
+    ingest.main(['--workers', '2'])
+    [pool] = pools
+    assert pool.maxconn == 2 and pool.closed
+    assert [len(conn.copies) for conn in pool.connections] == [1, 1]
+    assert all(conn.commits == 1 for conn in pool.connections)
+    table = shared_staging_table(db)
+    assert table.startswith(f'{ingest.STAGING_TABLE}_')
+    assert {sql for conn in pool.connections for sql, _ in conn.copies} == {
+        ingest.COPY_TUITION_LOGS_SQL.format(table=table)
+    }
+    assert sorted(row[1] for conn in pool.connections for row in copied_rows(conn)) == ['Math', 'Physics']
+    assert not db.copies
+    assert db.statements[-2:] == [
+        f"INSERT INTO tuition_logs ({COLUMNS}) SELECT {COLUMNS} FROM {table};",
+        f"DROP TABLE {table};",
+    ]
+
+
+def test_main_workers_use_a_new_staging_table_every_run(db, pools):
+    ingest.main(['--workers', '2'])
+    first_table = shared_staging_table(db)
+    db.statements.clear()
+    ingest.main(['--workers', '2'])
+    assert shared_staging_table(db) != first_table
+
+
+def test_main_workers_failure_leaves_tuition_logs_untouched(db, pools, monkeypatch, capsys):
+    monkeypatch.setattr(FakePool, 'fail_copy', True)
+    ingest.main(['--workers', '2'])
+    assert 'DATABASE ERROR: COPY failed' in capsys.readouterr().out
+    assert not [sql for sql in db.statements if 'tuition_logs RESTART' in sql or 'INSERT' in sql]
+    assert pools[0].closed
+    # The committed staging table is dropped again after rolling back the load
+    assert db.statements[-1] == f"DROP TABLE IF EXISTS {shared_staging_table(db)};"
+    assert db.rollbacks == 2 and db.commits == 2
+
+
+def test_main_copy_mode_stages_the_rows_in_a_temp_table(db):
+    ingest.main([])
+    assert [sql for sql in db.statements if sql.startswith('CREATE')] == [
+        f'CREATE TEMP TABLE {ingest.STAGING_TABLE} ON COMMIT DROP AS SELECT {COLUMNS} FROM tuition_logs WITH NO DATA;'
+    ]
+    [(sql, _)] = db.copies
+    assert sql == ingest.COPY_TUITION_LOGS_SQL.format(table=ingest.STAGING_TABLE)
+    assert db.statements.index(sql) < db.statements.index('TRUNCATE tuition_logs RESTART IDENTITY;')
+    assert MOVE_SQL in db.statements
+    assert db.commits == 1
+
+
+def test_main_values_mode_inserts_directly(db, monkeypatch):
+    monkeypatch.setattr(ingest, 'execute_values', lambda cur, sql, rows, page_size: None)
+    ingest.main(['--insert-mode', 'values'])
+    assert not [sql for sql in db.statements if ingest.STAGING_TABLE in sql]
+
+
+def test_read_log_rows_strips_curly_quotes_and_whitespace():
+    rows = read(HEADER + '2025-09-01,a,b,Math,"“ Omran ”, “Mila”",9,1\n2025-09-01,a,b,Math,“Al”i,6,1\n')
+    assert [row[2] for row in rows] == ['{"Omran","Mila"}', '{"Ali"}']
+
+
+def parse_pg_array(literal):
+    '''Minimal decoder for the always-quoted array literals to_pg_array writes.'''
+    assert literal[0] == '{' and literal[-1] == '}'
+    names, i, body = [], 0, literal[1:-1]
+    while i < len(body):
+        assert body[i] == '"'
+        i += 1
+        name = []
+        while body[i] != '"':
+            if body[i] == '\\':
+                i += 1
+            name.append(body[i])
+            i += 1
+        names.append(''.join(name))
+        i += 2  # closing quote and separating comma
+    return names
+
+
+@pytest.mark.parametrize('names', [
+    ['Ali'],
+    ['Omran', 'Mila'],
+    ['Al "The Great" Ali', 'back\\slash', 'comma, name', "O'Neil", '{braces}'],
+])
+def test_to_pg_array_round_trips_through_csv_writer(names):
+    literal = ingest.to_pg_array(names)
+    buf = io.StringIO()
+    csv.writer(buf).writerow(['x', literal])
+    assert next(csv.reader(io.StringIO(buf.getvalue()))) == ['x', literal]
+    assert parse_pg_array(literal) == names
+
+
+def test_insert_logs_prepared_executes_the_prepared_insert_in_batches(monkeypatch):
+    batches = []
+    monkeypatch.setattr(
+        ingest, 'execute_batch', lambda cur, sql, rows, page_size: batches.append((sql, rows, page_size)),
+    )
+    conn = FakeConnection()
+    rows = [('p', 'Math', '{"Ali"}', None, '6', 'd s', 'd e')]
+    ingest.insert_logs_prepared(conn.cursor(), rows)
+    assert conn.statements == [ingest.PREPARE_TUITION_LOGS_SQL, 'DEALLOCATE tuition_ins;']
+    assert ingest.PREPARE_TUITION_LOGS_SQL.endswith('VALUES ($1, $2, $3, $4, $5, $6, $7)')
+    assert batches == [(ingest.EXECUTE_TUITION_LOGS_SQL, rows, ingest.INSERT_PAGE_SIZE)]
+    assert ingest.EXECUTE_TUITION_LOGS_SQL == 'EXECUTE tuition_ins (%s, %s, %s, %s, %s, %s, %s)'
+
+
+def test_parse_args_prepared_mode():
+    assert ingest.parse_args(['--insert-mode', 'prepared']).insert_mode == 'prepared'
+    with pytest.raises(SystemExit):
+        ingest.parse_args(['--insert-mode', 'prepared', '--workers', '2'])
+
+
+def test_main_reloads_in_one_transaction_with_deferred_constraints(db):
+    ingest.main([])
+    assert db.autocommit is False
+    truncate = db.statements.index('TRUNCATE tuition_logs RESTART IDENTITY;')
+    assert 'SET CONSTRAINTS ALL DEFERRED;' in db.statements[truncate:]
+    assert db.commits == 1 and db.rollbacks == 0
+
+
+@pytest.mark.parametrize('answer', ['yes', 'YES', 'Yes', 'y', 'Y'])
+def test_main_accepts_the_confirmation(db, monkeypatch, answer):
+    monkeypatch.setattr('builtins.input', lambda prompt: answer)
+    ingest.main([])
+    assert db.commits == 1
+
+
+@pytest.mark.parametrize('answer', ['no', 'n', '', 'yes please'])
+def test_main_cancels_without_confirmation(db, monkeypatch, capsys, answer):
+    monkeypatch.setattr('builtins.input', lambda prompt: answer)
+    ingest.main([])
+    assert 'Operation cancelled by user.' in capsys.readouterr().out
+    assert not db.statements
+
+
+def test_get_parent_lookup():
+    assert ingest.get_parent_lookup(STUDENT_MAP) == {
+        'Ali': 'parent-Ali', 'Omran': 'parent-Omran', 'Mila': 'parent-Mila',
+    }
+
+
+def test_read_log_rows_skips_unknown_students_with_one_warning(capsys):
+    text = HEADER + ''.join(f'2025-09-01,a,b,Math,{names},6,1\n' for names in ['Bob', '"Mila,Bob"', 'Zed', 'Bob'])
+    assert [row[0] for row in read(text)] == ['parent-Mila']
+    out = capsys.readouterr().out
+    assert out == '  - WARNING: Skipping 3 rows. Students not found in the database: Bob, Zed.\n'
+
+
+def test_read_log_rows_passes_the_numbers_through_as_strings(capsys):
+    rows = read(HEADER + '2025-09-01,a,b,Math,Ali,6.50,\n2025-09-01,a,b,Math,Ali,abc,x\n')
+    assert [(row[3], row[4]) for row in rows] == [(None, '6.50'), ('x', 'abc')]
+    assert 'Skipping' not in capsys.readouterr().out
+
+
+def test_parse_args_truncate_and_quote_options():
+    args = ingest.parse_args([])
+    assert args.truncate and args.strip_curly_quotes
+    args = ingest.parse_args(['--no-truncate', '--no-strip-curly-quotes'])
+    assert not args.truncate and not args.strip_curly_quotes
+
+
+def test_main_no_truncate_appends_without_confirmation(db, monkeypatch):
+    def no_input(prompt):
+        raise AssertionError('--no-truncate must not ask for confirmation')
+
+    monkeypatch.setattr('builtins.input', no_input)
+    ingest.main(['--no-truncate'])
+    assert not [sql for sql in db.statements if sql.startswith('TRUNCATE tuition_logs ')]
+    assert MOVE_SQL in db.statements and db.commits == 1
+
+
+@pytest.mark.parametrize('strip_curly_quotes, names', [(True, '{"Ali"}'), (False, '{"“Ali”"}')])
+def test_read_log_rows_curly_quote_stripping_option(strip_curly_quotes, names):
+    students = {'Ali': ('1', 'parent-Ali'), '“Ali”': ('1', 'parent-Ali')}
+    csvfile = io.StringIO(HEADER + '2025-09-01,a,b,Math,“Ali”,6,1\n')
+    rows = ingest.read_log_rows(csvfile, students, strip_curly_quotes)
+    assert [row[2] for row in rows] == [names]
+
+
+def test_main_runs_the_load_statements_on_a_plain_cursor(db):
+    def statements_on(factory):
+        return [sql.split()[0] for sql, used in zip(db.statements, db.cursor_factories) if used is factory]
+
+    ingest.main(['--fast-reload'])
+    # The students signature checks and query, the index lookup and its DROP INDEX read dict rows
+    assert statements_on(ingest.RealDictCursor) == ['SELECT', 'SELECT', 'SELECT', 'SELECT', 'DROP']
+    assert set(statements_on(None)) == {'CREATE', 'TRUNCATE', 'COPY', 'SET', 'INSERT', 'DROP', 'ALTER'}
+
+
+def test_read_log_rows_checks_the_width_of_the_columns_it_uses(capsys):
+    # Without lesson_index only the six required columns have to be present
+    text = 'date,start_time,end_time,subject,attendees,cost_per_hour,notes\n2025-09-01,a,b,Math,Ali,6\n'
+    assert [row[0] for row in read(text)] == ['parent-Ali']
+    assert not capsys.readouterr().out
+
+
+def test_pandas_reader_reports_unknown_students_like_the_csv_reader(capsys):
+    pytest.importorskip('pandas')
+    text = HEADER + '2025-09-01,a,b,Math,Bob,6,1\n2025-09-01,a,b,Math,Ali,6,1\n2025-09-01,a,b,Math,Bob,6,1\n'
+    expected = read(text)
+    csv_out = capsys.readouterr().out
+    assert ingest.read_log_rows_pandas(io.StringIO(text), STUDENT_MAP) == expected
+    assert capsys.readouterr().out == csv_out
+
+
+def test_blank_lesson_index_is_null_in_both_readers():
+    text = HEADER + '2025-09-01,a,b,Math,Ali,6,\n2025-09-01,a,b,Math,Ali,6, \n2025-09-01,a,b,Math,Ali,6, 3 \n'
+    assert [row[3] for row in read(text)] == [None, None, '3']
+    pytest.importorskip('pandas')
+    assert ingest.read_log_rows_pandas(io.StringIO(text), STUDENT_MAP) == read(text)
+
+
+def test_rows_without_attendees_are_invalid_rows(capsys):
+    text = HEADER + '2025-09-01,a,b,Math,,6,1\n2025-09-01,a,b,Math,“”,6,1\n2025-09-01,a,b,Math,Ali,6,1\n'
+    assert [row[0] for row in read(text)] == ['parent-Ali']
+    out = capsys.readouterr().out
+    assert out.count('Reason: no attendees.') == 2
+    assert 'not found in the database' not in out
+    pytest.importorskip('pandas')
+    assert ingest.read_log_rows_pandas(io.StringIO(text), STUDENT_MAP) == read(text)
+
+
+BLANK_COST_CSV = HEADER + '2025-09-01,a,b,Math,Ali,,1\n2025-09-01,a,b,Math,Ali, ,2\n2025-09-01,a,b,Math,Ali,6,3\n'
+
+
+def test_rows_without_a_cost_are_invalid_rows(capsys):
+    assert [row[3:5] for row in read(BLANK_COST_CSV)] == [('3', '6')]
+    assert capsys.readouterr().out.count('Reason: no cost_per_hour.') == 2
+    pytest.importorskip('pandas')
+    assert ingest.read_log_rows_pandas(io.StringIO(BLANK_COST_CSV), STUDENT_MAP) == read(BLANK_COST_CSV)
+
+
+@pytest.mark.parametrize('mode', ['copy', 'values', 'prepared'])
+def test_every_loader_skips_rows_without_a_cost(db, monkeypatch, mode):
+    loaded = []
+    monkeypatch.setattr(ingest, 'execute_values', lambda cur, sql, rows, page_size: loaded.extend(rows))
+    monkeypatch.setattr(ingest, 'execute_batch', lambda cur, sql, rows, page_size: loaded.extend(rows))
+    with open(ingest.CSV_FILE_PATH, 'w', encoding='utf-8') as f:
+        f.write(BLANK_COST_CSV)
+    ingest.main(['--insert-mode', mode])
+    rows = copied_rows(db) if mode == 'copy' else loaded
+    assert [row[4] for row in rows] == ['6']
+    assert db.commits == 1
+
+
+def test_parse_args_rejects_fast_reload_with_prepared_mode():
+    assert ingest.parse_args(['--fast-reload']).fast_reload
+    assert ingest.parse_args(['--insert-mode', 'values', '--fast-reload']).fast_reload
+    with pytest.raises(SystemExit):
+        ingest.parse_args(['--insert-mode', 'prepared', '--fast-reload'])
+
+
+RAGGED_CSVS = {
+    'trailing comma on every row': HEADER + '2025-09-01,10:00,11:00,Math,Ali,6,1,\n2025-09-02,10:00,11:00,Math,Mila,7,2,\n',
+    'trailing comma on some rows': HEADER + '2025-09-01,10:00,11:00,Math,Ali,6,1\n2025-09-02,10:00,11:00,Math,Mila,7,2,,\n',
+    'lesson_index field missing': HEADER + '2025-09-01,10:00,11:00,Math,Ali,6\n2025-09-02,10:00,11:00,Math,Mila,7,2\n',
+    'short and blank rows': HEADER + '2025-09-01,10:00\n\n   \n2025-09-02,10:00,11:00,Math,Mila,7,2\n',
+    'every row short': HEADER + '2025-09-01,10:00,11:00,Math,Ali,6\n',
+    'unused trailing column': 'date,start_time,end_time,subject,attendees,cost_per_hour,notes\n'
+                              '2025-09-01,10:00,11:00,Math,Ali,6\n2025-09-02,10:00,11:00,Math,Mila,7,late\n',
+}
+
+
+@pytest.mark.parametrize('text', RAGGED_CSVS.values(), ids=RAGGED_CSVS.keys())
+def test_pandas_reader_matches_the_csv_reader_on_ragged_rows(text, capsys):
+    pytest.importorskip('pandas')
+    expected = read(text)
+    csv_warnings = sorted(capsys.readouterr().out.splitlines())
+    assert ingest.read_log_rows_pandas(io.StringIO(text), STUDENT_MAP) == expected
+    assert sorted(capsys.readouterr().out.splitlines()) == csv_warnings
+
+
+def test_read_log_rows_ignores_extra_trailing_fields(capsys):
+    assert read(RAGGED_CSVS['trailing comma on every row']) == [
+        ('parent-Ali', 'Math', '{"Ali"}', '1', '6', '2025-09-01 10:00', '2025-09-01 11:00'),
+        ('parent-Mila', 'Math', '{"Mila"}', '2', '7', '2025-09-02 10:00', '2025-09-02 11:00'),
+    ]
+    assert not capsys.readouterr().out
+
+
+def test_main_pandas_without_pandas_installed(db, monkeypatch, capsys):
+    monkeypatch.setitem(sys.modules, 'pandas', None)
+    ingest.main(['--pandas'])
+    assert 'ERROR: --pandas needs pandas installed' in capsys.readouterr().out
+    assert not db.copies and db.commits == 0 and db.rollbacks == 1